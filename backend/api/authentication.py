@@ -0,0 +1,107 @@
+import copy
+import time
+from hashlib import sha256
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+TOKEN_CACHE_KEY = "auth-token:{}"
+
+
+def token_cache_key(key):
+    # Сам токен в ключ кэша не попадает
+    return TOKEN_CACHE_KEY.format(sha256(key.encode()).hexdigest())
+
+
+class LocalTTLCache:
+    """Небольшой кэш процесса с истечением записей через timeout секунд."""
+
+    def __init__(self, timeout, max_size):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._lock = Lock()
+        self._data = {}
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.max_size:
+                now = time.monotonic()
+                self._data = {
+                    k: entry for k, entry in self._data.items()
+                    if entry[1] >= now
+                }
+                if len(self._data) >= self.max_size:
+                    self._data.clear()
+            self._data[key] = (value, time.monotonic() + self.timeout)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+local_token_cache = LocalTTLCache(
+    settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT,
+    settings.AUTH_TOKEN_LOCAL_CACHE_SIZE,
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без SELECT токена и пользователя на каждый запрос.
+
+    Пользователь ищется в кэше процесса (AUTH_TOKEN_LOCAL_CACHE_TIMEOUT),
+    затем в общем кэше (AUTH_TOKEN_CACHE_TIMEOUT) и только потом в БД.
+    Записи сбрасываются при удалении токена (logout) и сохранении
+    пользователя (смена пароля, деактивация, правка профиля), см.
+    api.signals; в других процессах кэш процесса доживает свой короткий
+    срок.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        user = local_token_cache.get(cache_key)
+        if user is None:
+            user = cache.get(cache_key)
+            if user is None:
+                user, _ = super().authenticate_credentials(key)
+                cache.set(
+                    cache_key, user, settings.AUTH_TOKEN_CACHE_TIMEOUT
+                )
+            local_token_cache.set(cache_key, user)
+        if not user.is_active:
+            raise AuthenticationFailed("User inactive or deleted.")
+        # Копия, чтобы изменения request.user не попали в общий кэш
+        user = copy.copy(user)
+        token = Token(key=key, user_id=user.pk)
+        token.user = user
+        return user, token
+
+
+def invalidate_token(key):
+    cache_key = token_cache_key(key)
+
+    def invalidate():
+        local_token_cache.delete(cache_key)
+        cache.delete(cache_key)
+
+    invalidate()
+    # Повторно после коммита: параллельный запрос мог успеть закэшировать
+    # ещё не изменённого пользователя
+    transaction.on_commit(invalidate)
+
+
+def invalidate_user_tokens(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list(
+        "key", flat=True
+    ):
+        invalidate_token(key)
@@ -0,0 +1,170 @@
+import time
+from bisect import bisect_left
+from hashlib import md5
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from core.models import Ingredient
+
+# Символ больше любого символа в названиях: граница диапазона по префиксу
+_MAX_CHAR = chr(0x10FFFF)
+
+CATALOG_VERSION_KEY = "catalog-version:{}"
+INGREDIENTS = "ingredients"
+TAGS = "tags"
+
+
+def catalog_version_timeout():
+    """Срок жизни версии каталога в кэше.
+
+    В общем кэше версия живёт бессрочно. Кэш процесса (locmem) не видит
+    bump из других процессов — manage.py load_ingredients, load_tags,
+    админки в другом воркере, — поэтому там версия истекает через
+    CATALOG_VERSION_TIMEOUT и такие изменения видны не позже этого срока.
+    """
+    if isinstance(caches["default"], LocMemCache):
+        return settings.CATALOG_VERSION_TIMEOUT
+    return None
+
+
+def get_catalog_version(label):
+    """Время последнего изменения каталога (ингредиентов или тегов).
+
+    Если значение вытеснено или истекло, версией становится текущее
+    время, и клиенты просто получат каталог заново.
+    """
+    return cache.get_or_set(
+        CATALOG_VERSION_KEY.format(label), time.time,
+        timeout=catalog_version_timeout(),
+    )
+
+
+def bump_catalog_version(label):
+    cache.set(
+        CATALOG_VERSION_KEY.format(label), time.time(),
+        timeout=catalog_version_timeout(),
+    )
+
+
+class IngredientIndex:
+    """Отсортированный in-memory индекс названий ингредиентов.
+
+    Строится лениво при первом обращении и перестраивается при смене
+    версии каталога ингредиентов: при записи через ORM (см. api.signals)
+    и по истечении версии (см. catalog_version_timeout), так что загрузка
+    из другого процесса не оставляет индекс пустым до перезапуска.
+    Поиск по префиксу — два bisect по отсортированному списку, без
+    запросов к БД.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._data = None
+        self._version = None
+
+    def _get_data(self):
+        # Сверка с версией каталога подхватывает изменения из других
+        # процессов: с общим кэшем сразу, с locmem — когда версия истечёт.
+        version = get_catalog_version(INGREDIENTS)
+        data = self._data
+        if data is None or self._version != version:
+            with self._lock:
+                data = self._data
+                if data is None or self._version != version:
+                    data = self._data = self._build()
+                    self._version = version
+        return data
+
+    @staticmethod
+    def _build():
+        rows = [
+            {"id": pk, "name": name, "measurement_unit": unit}
+            for pk, name, unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit"
+            )
+        ]
+        by_name = sorted(rows, key=lambda row: row["name"])
+        by_folded = sorted(rows, key=lambda row: row["name"].casefold())
+        return {
+            False: ([row["name"] for row in by_name], by_name),
+            True: ([row["name"].casefold() for row in by_folded], by_folded),
+        }
+
+    def search(self, prefix="", limit=None, ignore_case=True):
+        """Возвращает ингредиенты, название которых начинается с prefix."""
+        keys, rows = self._get_data()[ignore_case]
+        if ignore_case:
+            prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + _MAX_CHAR, lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return rows[start:end]
+
+
+ingredient_index = IngredientIndex()
+
+
+class CatalogCacheMixin:
+    """Условные GET и кэш готовых ответов для почти статичных каталогов.
+
+    ETag и Last-Modified вычисляются из версии каталога, поэтому запрос
+    с совпадающим If-None-Match получает 304 без обращения к БД, а
+    отрендеренное JSON-тело ответа хранится в кэше до следующей записи.
+    """
+
+    catalog_label = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_catalog_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_catalog_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_catalog_response(self, handler, request, *args, **kwargs):
+        version = get_catalog_version(self.catalog_label)
+        renderer = request.accepted_renderer
+        etag = quote_etag(md5(
+            f"{self.catalog_label}:{version}:{renderer.format}:"
+            f"{request.get_full_path()}".encode(),
+            usedforsecurity=False,
+        ).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(version)
+        )
+        if response is None:
+            response = self.get_cached_response(
+                etag, handler, request, *args, **kwargs
+            )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(int(version))
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def get_cached_response(self, etag, handler, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if renderer.format != "json":
+            return handler(request, *args, **kwargs)
+        body_key = f"catalog-body:{etag}"
+        content = cache.get(body_key)
+        if content is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content = renderer.render(
+                response.data,
+                request.accepted_media_type,
+                self.get_renderer_context(),
+            )
+            cache.set(body_key, content, settings.CATALOG_CACHE_TIMEOUT)
+        return HttpResponse(content, content_type=renderer.media_type)
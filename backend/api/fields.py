@@ -0,0 +1,136 @@
+import binascii
+import re
+from io import BytesIO
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from PIL import Image, ImageFile
+from rest_framework import serializers
+
+from core.images import variant_urls
+
+# Кратно 4, чтобы каждый кусок base64 декодировался независимо
+B64_CHUNK_SIZE = 64 * 1024
+# Сколько байт отдаём Pillow на распознавание заголовка
+HEADER_SNIFF_LIMIT = 256 * 1024
+# Строгая проверка алфавита: a2b_base64(strict_mode=True) есть только
+# с Python 3.11, а образ собирается на 3.10
+B64_CHUNK_PATTERN = re.compile(r"[A-Za-z0-9+/]*={0,2}")
+
+
+class Base64ImageField(serializers.ImageField):
+    """ImageField, принимающий data:image/...;base64,...
+
+    Строка декодируется кусками: размер проверяется ещё до декодирования,
+    формат и размеры в пикселях — по заголовку, пока не декодирован весь
+    файл. Данные до IMAGE_UPLOAD_SPOOL_SIZE держатся в памяти, больше —
+    пишутся во временный файл, который Django открывает по пути без
+    лишней копии в памяти.
+    """
+
+    default_error_messages = {
+        "invalid_base64": "Invalid base64 image data.",
+        "too_large": "Image is larger than {max_size} bytes.",
+        "unsupported_format": "Unsupported image format: {image_format}.",
+        "too_many_pixels": "Image is larger than {max_pixels} pixels.",
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith("data:image"):
+            header, sep, imgstr = data.partition(";base64,")
+            if not sep:
+                self.fail("invalid_base64")
+            data = self.decode(imgstr, header.split("/")[-1])
+        return super().to_internal_value(data)
+
+    def decode(self, imgstr, ext):
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        # Оценка по длине строки отсекает заведомо большие файлы даром
+        if len(imgstr) // 4 * 3 > max_size + 2:
+            self.fail("too_large", max_size=max_size)
+        sniffer = ImageFile.Parser()
+        buffer = BytesIO()
+        spooled = None
+        size = 0
+        carry = ""
+        padded = False
+        for start in range(0, len(imgstr), B64_CHUNK_SIZE):
+            chunk = "".join((carry + imgstr[start:start + B64_CHUNK_SIZE])
+                            .split())
+            cut = len(chunk) - len(chunk) % 4
+            chunk, carry = chunk[:cut], chunk[cut:]
+            # Паддинг допустим только в самом конце данных
+            if (padded and chunk) or not B64_CHUNK_PATTERN.fullmatch(chunk):
+                self.fail("invalid_base64")
+            padded = chunk.endswith("=")
+            try:
+                decoded = binascii.a2b_base64(chunk)
+            except binascii.Error:
+                self.fail("invalid_base64")
+            if sniffer is not None and size < HEADER_SNIFF_LIMIT:
+                try:
+                    sniffer.feed(decoded)
+                except Image.DecompressionBombError:
+                    # Pillow сам отвергает заголовки больше
+                    # 2 * Image.MAX_IMAGE_PIXELS
+                    self.fail("too_many_pixels",
+                              max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS)
+                except OSError:
+                    self.fail("invalid_image")
+                if sniffer.image is not None:
+                    ext = self.check_header(sniffer.image)
+                    sniffer = None
+            size += len(decoded)
+            if size > max_size:
+                self.fail("too_large", max_size=max_size)
+            if spooled is None and size > settings.IMAGE_UPLOAD_SPOOL_SIZE:
+                spooled = TemporaryUploadedFile(
+                    "temp", "application/octet-stream", 0, None
+                )
+                spooled.write(buffer.getvalue())
+                buffer = spooled
+            buffer.write(decoded)
+        if carry:
+            self.fail("invalid_base64")
+        # Уникальное имя: по нему строятся неизменяемые URL вариантов
+        name = f"{uuid4().hex}.{ext.lower()}"
+        if spooled is not None:
+            spooled.name = name
+            spooled.size = size
+            spooled.seek(0)
+            return spooled
+        buffer.seek(0)
+        return InMemoryUploadedFile(
+            buffer, self.field_name, name, None, size, None
+        )
+
+    def check_header(self, image):
+        if image.format not in settings.IMAGE_UPLOAD_FORMATS:
+            self.fail("unsupported_format", image_format=image.format)
+        max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+        if image.width * image.height > max_pixels:
+            self.fail("too_many_pixels", max_pixels=max_pixels)
+        return image.format
+
+
+class ImageVariantsField(serializers.Field):
+    """URL уменьшенных копий изображения (см. core.images)."""
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        urls = variant_urls(value.name if value else None)
+        request = self.context.get("request")
+        if urls is None or request is None:
+            return urls
+        return {
+            variant: {
+                ext: request.build_absolute_uri(url)
+                for ext, url in formats.items()
+            }
+            for variant, formats in urls.items()
+        }
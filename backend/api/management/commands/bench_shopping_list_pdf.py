@@ -0,0 +1,89 @@
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from PyPDF2 import PdfMerger
+
+from api.pagination import paginate_list
+from api.services import pdf_over_template, render_pdf
+from api.views import DownloadShoppingListView
+
+TEMPLATE = DownloadShoppingListView.template
+ROWS_PER_PAGE = DownloadShoppingListView.rows_per_page
+
+
+def render_chunked(request, shopping_list):
+    """Прежний способ: отдельный PDF на каждые 25 строк и PdfMerger."""
+    pdf_merger = PdfMerger()
+    for chunk in paginate_list(shopping_list, ROWS_PER_PAGE):
+        pdf_data = pdf_over_template(
+            request, TEMPLATE, {'shopping_list': chunk}
+        )
+        pdf_merger.append(BytesIO(pdf_data['pdf']))
+    pdf_output = BytesIO()
+    pdf_merger.write(pdf_output)
+    pdf_merger.close()
+    return pdf_output.getvalue()
+
+
+def render_single_pass(request, shopping_list):
+    output = BytesIO()
+    render_pdf(
+        request,
+        TEMPLATE,
+        {'shopping_list': shopping_list, 'rows_per_page': ROWS_PER_PAGE},
+        target=output,
+    )
+    return output.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compare chunked and single-pass shopping list PDF rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[25, 250, 2500],
+            help='Numbers of shopping list rows to render'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Runs per size; the best time is reported'
+        )
+
+    def handle(self, *args, **kwargs):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        renderers = (
+            ('chunked', render_chunked),
+            ('single-pass', render_single_pass),
+        )
+        for size in kwargs['sizes']:
+            shopping_list = [
+                {'product': f'product {i}', 'amount': i, 'unit': 'г'}
+                for i in range(size)
+            ]
+            for name, renderer in renderers:
+                best, peak, pdf_size = self.measure(
+                    renderer, request, shopping_list, kwargs['repeat']
+                )
+                self.stdout.write(
+                    f'{size:>6} rows  {name:<12} {best * 1000:>10.1f} ms  '
+                    f'peak {peak / 2 ** 20:>8.1f} MiB  '
+                    f'pdf {pdf_size / 1024:>8.1f} KiB'
+                )
+
+    @staticmethod
+    def measure(renderer, request, shopping_list, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pdf = renderer(request, shopping_list)
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        renderer(request, shopping_list)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return best, peak, len(pdf)
@@ -0,0 +1,16 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreFormatContentNegotiation(BaseContentNegotiation):
+    """Всегда выбирает первый рендерер и не смотрит на ?format=.
+
+    Нужен представлениям, которые сами отдают файл в формате из
+    query-параметра format: иначе DRF ответил бы 404 на неизвестный ему
+    формат (например, csv).
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -1,14 +1,145 @@
-from rest_framework.pagination import PageNumberPagination
+from hashlib import md5
+from urllib.parse import urlencode
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+COUNT_CACHE_VERSION_KEY = "pagination-count-version"
+
+
+def get_count_cache_version():
+    return cache.get_or_set(COUNT_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_count_cache():
+    """Сбрасывает все закэшированные count, меняя версию ключей."""
+    try:
+        cache.incr(COUNT_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт count из кэша или из оценки планировщика."""
+
+    def __init__(self, *args, cache_key=None, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = self.estimate_count() if self.estimate else None
+            if count is None:
+                count = super().count
+            cache.set(
+                self.cache_key,
+                count,
+                settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+            )
+        return count
+
+    def estimate_count(self):
+        """Оценка числа строк из pg_class для нефильтрованного списка.
+
+        Возвращает None, если база не PostgreSQL или таблица ещё не
+        анализировалась.
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class "
+                "WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if not row or row[0] <= 0:
+            return None
+        return row[0]
+
+
+class CachedCountPaginationMixin:
+    """Кэширует count страничной пагинации по нормализованным фильтрам.
+
+    Ключ включает версию, которая меняется при записи рецептов, избранного,
+    корзины и подписок (см. api.signals), так что устаревшее значение живёт
+    не дольше PAGINATION_COUNT_CACHE_TIMEOUT.
+    """
+
+    # Параметры, результат которых зависит от текущего пользователя
+    user_dependent_params = ()
+    count_per_user = False
+    estimate_unfiltered_count = False
+
+    def django_paginator_class(self, object_list, per_page):
+        filters = self.get_count_filters(self.request)
+        return CachedCountPaginator(
+            object_list,
+            per_page,
+            cache_key=self.get_count_cache_key(self.request, filters),
+            estimate=(
+                self.estimate_unfiltered_count
+                and settings.PAGINATION_ESTIMATE_COUNT
+                and not filters
+            ),
+        )
+
+    def get_count_filters(self, request):
+        ignored = {self.page_query_param, self.page_size_query_param}
+        return sorted(
+            (key, sorted(set(values)))
+            for key, values in request.query_params.lists()
+            if key not in ignored
+        )
+
+    def get_count_cache_key(self, request, filters):
+        per_user = self.count_per_user or any(
+            key in self.user_dependent_params for key, _ in filters
+        )
+        user_id = request.user.id if per_user else None
+        params = urlencode(filters, doseq=True)
+        digest = md5(
+            f"{request.path}?{params}#{user_id}".encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        return f"pagination-count:{get_count_cache_version()}:{digest}"
+
+
+class LimitPagination(CachedCountPaginationMixin, PageNumberPagination):
+    page_size_query_param = "limit"
+    max_page_size = 100
+    user_dependent_params = ("is_favorited", "is_in_shopping_cart")
+    estimate_unfiltered_count = True
+
+
+class LimitCursorPagination(CursorPagination):
+    """Keyset-пагинация без COUNT(*) и OFFSET.
+
+    Страница выбирается условием по индексированному первичному ключу
+    (id < последнего id предыдущей страницы), поэтому стоимость запроса
+    не зависит от глубины прокрутки.
+    """
 
-class LimitPagination(PageNumberPagination):
     page_size_query_param = "limit"
     max_page_size = 100
+    ordering = "-id"
 
 
-class SubLimitPagination(PageNumberPagination):
+class SubLimitPagination(CachedCountPaginationMixin, PageNumberPagination):
     page_size_query_param = "limit"
     max_page_size = 100
+    count_per_user = True
 
 
 def paginate_list(items, page_size):
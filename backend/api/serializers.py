@@ -1,16 +1,34 @@
-from base64 import b64decode
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from rest_framework import serializers
 from rest_framework.generics import ValidationError
 from core.models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
-                         ShoppingCart, ShortenedRecipeURL, Subscription, Tag)
+                         ShoppingCart, ShoppingListItem, Subscription, Tag)
+from core.images import variant_urls
+from core.shortcodes import encode_recipe_id
+
+from .fields import Base64ImageField, ImageVariantsField
 
 User = get_user_model()
 
 
+def get_subscribed_ids(context):
+    """Возвращает id авторов, на которых подписан текущий пользователь.
+
+    Множество загружается одним запросом и сохраняется в контексте
+    корневого сериализатора, поэтому все вложенные UserSerializer одного
+    запроса используют его совместно.
+    """
+    if "subscribed_ids" not in context:
+        context["subscribed_ids"] = set(
+            context["request"].user.subscriptions.values_list(
+                "subscribed_to_id", flat=True
+            )
+        )
+    return context["subscribed_ids"]
+
+
 class UserCreateSerializer(BaseUserCreateSerializer):
     class Meta(BaseUserCreateSerializer.Meta):
         model = User
@@ -23,6 +41,7 @@ class UserSerializer(serializers.ModelSerializer):
     """Для получения списка пользователей."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField(source="avatar")
 
     class Meta:
         model = User
@@ -33,6 +52,7 @@ class UserSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_variants",
             "is_subscribed",
         ]
 
@@ -40,7 +60,7 @@ class UserSerializer(serializers.ModelSerializer):
         user = self.context["request"].user
         if user.is_anonymous:
             return False
-        return user.subscriptions.filter(subscribed_to=obj).exists()
+        return obj.id in get_subscribed_ids(self.context)
 
 
 class SubList(serializers.ModelSerializer):
@@ -74,29 +94,33 @@ class SubList(serializers.ModelSerializer):
         return None
 
     def get_is_subscribed(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return user.subscriptions.filter(
-            subscribed_to=obj.subscribed_to
-        ).exists()
+        # Список состоит только из подписок текущего пользователя
+        return True
 
     def get_recipes(self, obj):
-        recipes = obj.subscribed_to.recipes.all()
-        limit = self.context["request"].query_params.get("recipes_limit", None)
-        if limit:
-            recipes = recipes[: int(limit)]
+        # Превью предзагружены в SubscriptionsListView.get_queryset
+        recipes = getattr(obj.subscribed_to, "recipe_previews", None)
+        if recipes is None:
+            recipes = obj.subscribed_to.recipes.all()
+            limit = self.context["request"].query_params.get(
+                "recipes_limit", None
+            )
+            if limit:
+                recipes = recipes[: int(limit)]
         return [
             {
                 "id": recipe.id,
                 "name": recipe.name,
                 "image": recipe.image.url,
+                "image_variants": variant_urls(recipe.image.name),
                 "cooking_time": recipe.cooking_time,
             }
             for recipe in recipes
         ]
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, "recipes_count"):
+            return obj.recipes_count
         return obj.subscribed_to.recipes.all().count()
 
 
@@ -162,6 +186,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                 "id": recipe.id,
                 "name": recipe.name,
                 "image": recipe.image.url,
+                "image_variants": variant_urls(recipe.image.name),
                 "cooking_time": recipe.cooking_time,
             }
             for recipe in recipes
@@ -183,16 +208,6 @@ class SubscribeSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "subscribed_to", "created_at"]
 
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith("data:image"):
-            format, imgstr = data.split(";base64,")
-            ext = format.split("/")[-1]
-            data = ContentFile(b64decode(imgstr), name="temp." + ext)
-
-        return super().to_internal_value(data)
-
-
 class AvatarSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField(required=True, allow_null=True)
 
@@ -229,6 +244,7 @@ class RecipeListOrRetrieveSerializer(serializers.ModelSerializer):
     ingredients = IngredientSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_variants = ImageVariantsField(source="image")
 
     class Meta:
         model = Recipe
@@ -241,6 +257,7 @@ class RecipeListOrRetrieveSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
         ]
@@ -248,12 +265,17 @@ class RecipeListOrRetrieveSerializer(serializers.ModelSerializer):
     def get_is_favorited(self, obj):
         user = self.context["request"].user
         if user and user.is_authenticated:
+            # Флаг аннотирован в RecipeViewSet.get_queryset
+            if hasattr(obj, "is_favorited"):
+                return obj.is_favorited
             return obj.is_favorited_by(user)
         return False
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context["request"].user
         if user and user.is_authenticated:
+            if hasattr(obj, "is_in_shopping_cart"):
+                return obj.is_in_shopping_cart
             return obj.is_in_shopping_cart_by(user)
         return False
 
@@ -359,11 +381,18 @@ class RecipePostOrPatchSerializer(serializers.ModelSerializer):
         recipe.refresh_from_db()
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if validated_data.get("ingredients"):
             ingredients_data = validated_data.pop("ingredients")
+            old_amounts = ShoppingListItem.objects.recipe_amounts(instance.id)
             instance.ingredients.all().delete()
             self.add_ingredients(instance, ingredients_data)
+            ShoppingListItem.objects.change_recipe(
+                instance.id,
+                old_amounts,
+                ShoppingListItem.objects.recipe_amounts(instance.id),
+            )
         super().update(instance, validated_data)
 
         return instance
@@ -379,11 +408,11 @@ class RecipeLinkSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ["short_link"]
+        fields = ["short_link", "link_clicks"]
 
-    def get_short_link(self, obj: ShortenedRecipeURL):
+    def get_short_link(self, obj: Recipe):
         request = self.context.get("request")
-        short_code = obj.shortened_url.short_code
+        short_code = encode_recipe_id(obj.id)
         return request.build_absolute_uri(f"/s/{short_code}/")
 
     def to_representation(self, instance):
@@ -1,14 +1,369 @@
+import csv
+import json
+import logging
+import mimetypes
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from hashlib import sha256
+from threading import BoundedSemaphore, Lock
+from urllib.parse import unquote, urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.db.models import F
 from django.template.loader import get_template
 from django.utils import timezone
-from weasyprint import HTML
+from django.utils._os import safe_join
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
 
+from core.models import ShoppingListItem
 
-def pdf_over_template(request, template_location: str, context: dict) -> dict:
+PDF_STYLESHEET = "api/css/shopping_list_pdf.css"
+SHOPPING_LIST_FIELDS = ("name", "measurement_unit", "amount")
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+PDF_RESULT_KEY = "shopping-list-pdf:{}:{}"
+PDF_STATUS_KEY = "shopping-list-pdf-status:{}:{}"
+PDF_PENDING = "pending"
+PDF_FAILED = "failed"
+PDF_DONE = "done"
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_local_url(url):
+    """Путь на диске для URL статики или медиа, иначе None."""
+    path = unquote(urlsplit(url).path)
+    if path.startswith(settings.STATIC_URL):
+        relative = path[len(settings.STATIC_URL):]
+        return finders.find(relative) or safe_join(
+            settings.STATIC_ROOT, relative
+        )
+    if path.startswith(settings.MEDIA_URL):
+        return safe_join(settings.MEDIA_ROOT, path[len(settings.MEDIA_URL):])
+    return None
+
+
+def local_url_fetcher(url, timeout=10, ssl_context=None):
+    """url_fetcher для WeasyPrint, который никогда не ходит в сеть.
+
+    Статика и медиа читаются с локального диска, data: URL разбираются
+    стандартным fetcher'ом, всё остальное отклоняется — WeasyPrint
+    пропустит такой ресурс с предупреждением в логе.
+    """
+    if url.startswith("data:"):
+        return default_url_fetcher(url, timeout, ssl_context)
+    filename = resolve_local_url(url)
+    if filename is None:
+        raise ValueError(f"External resource is not allowed: {url}")
+    return {
+        "file_obj": open(filename, "rb"),
+        "mime_type": mimetypes.guess_type(filename)[0],
+        "redirected_url": url,
+    }
+
+
+@lru_cache(maxsize=None)
+def get_font_config():
+    return FontConfiguration()
+
+
+@lru_cache(maxsize=None)
+def get_pdf_stylesheets():
+    """Разобранные стили PDF, общие для всех запросов процесса."""
+    return (
+        CSS(
+            filename=finders.find(PDF_STYLESHEET),
+            url_fetcher=local_url_fetcher,
+            font_config=get_font_config(),
+        ),
+    )
+
+
+def render_html(request, template_location: str, context: dict) -> str:
     template = get_template(template_location)
-    html_string = template.render(context, request=request)
-    pdf = HTML(string=html_string).write_pdf()
+    return template.render(context, request=request)
+
+
+def html_to_pdf(html_string: str, base_url: str, target=None):
+    """Переводит HTML в PDF за один проход WeasyPrint.
+
+    Если передан target (файлоподобный объект, например HttpResponse),
+    PDF пишется прямо в него и функция возвращает None.
+    """
+    html = HTML(
+        string=html_string,
+        base_url=base_url,
+        url_fetcher=local_url_fetcher,
+    )
+    return html.write_pdf(
+        target,
+        stylesheets=get_pdf_stylesheets(),
+        font_config=get_font_config(),
+    )
+
+
+def render_pdf(request, template_location: str, context: dict, target=None):
+    return html_to_pdf(
+        render_html(request, template_location, context),
+        request.build_absolute_uri("/"),
+        target,
+    )
+
+
+class PdfRenderUnavailable(APIException):
+    """Пул рендеринга PDF переполнен или не успел за отведённое время.
+
+    Атрибут wait превращается обработчиком исключений DRF в заголовок
+    Retry-After.
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "PDF rendering is busy, try again later."
+    default_code = "pdf_render_unavailable"
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = settings.PDF_RENDER_RETRY_AFTER
+
+
+def _convert_html_to_pdf(html_string, base_url):
+    """Выполняется в процессе пула: PDF и время рендера в секундах."""
+    start = time.perf_counter()
+    pdf = html_to_pdf(html_string, base_url)
+    return pdf, time.perf_counter() - start
+
+
+class PdfRenderPool:
+    """Ограниченный пул процессов для перевода HTML в PDF.
+
+    WeasyPrint нагружает CPU и держит GIL, поэтому рендер вынесен из
+    процессов gunicorn. Одновременно принимается не больше
+    workers + queue_size задач; сверх этого сразу поднимается
+    PdfRenderUnavailable (503 с Retry-After), а не копится очередь.
+    """
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._lock = Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: не наследуем потоки и соединения с БД родителя
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=django.setup,
+                )
+            return self._executor
+
+    def _reset_executor(self, executor):
+        """Заменяет сломанный пул (например, воркер убит OOM) новым при
+        следующей задаче."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, html_string, base_url):
+        """Future с результатом (pdf, render_seconds)."""
+        return self._submit(html_string, base_url)[1]
+
+    def _submit(self, html_string, base_url):
+        if not self._slots.acquire(blocking=False):
+            logger.warning("PDF render queue is full")
+            raise PdfRenderUnavailable()
+        submitted = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            future = executor.submit(
+                _convert_html_to_pdf, html_string, base_url
+            )
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_executor(executor)
+            raise PdfRenderUnavailable()
+        future.add_done_callback(
+            lambda done: self._on_done(done, submitted)
+        )
+        return executor, future
+
+    def _on_done(self, future, submitted):
+        self._slots.release()
+        if future.cancelled() or future.exception() is not None:
+            return
+        pdf, render_seconds = future.result()
+        total = time.perf_counter() - submitted
+        logger.info(
+            "PDF rendered in %.1f ms (queued %.1f ms), %d bytes",
+            render_seconds * 1000,
+            (total - render_seconds) * 1000,
+            len(pdf),
+        )
+
+    def render(self, html_string, base_url):
+        """Синхронный рендер: (pdf, render_seconds, total_seconds)."""
+        submitted = time.perf_counter()
+        executor, future = self._submit(html_string, base_url)
+        try:
+            pdf, render_seconds = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            logger.warning("PDF render timed out after %s s", self.timeout)
+            raise PdfRenderUnavailable()
+        except BrokenProcessPool:
+            logger.error("PDF render worker died, restarting the pool")
+            self._reset_executor(executor)
+            raise PdfRenderUnavailable()
+        return pdf, render_seconds, time.perf_counter() - submitted
+
+
+pdf_pool = PdfRenderPool(
+    workers=settings.PDF_RENDER_WORKERS,
+    queue_size=settings.PDF_RENDER_QUEUE_SIZE,
+    timeout=settings.PDF_RENDER_TIMEOUT,
+)
+
+
+def pdf_over_template(request, template_location: str, context: dict) -> dict:
+    pdf = render_pdf(request, template_location, context)
     time = timezone.now()
     filename = f"shopping_list_{time}.pdf"
 
     pdf_data = dict(pdf=pdf, filename=filename)
     return pdf_data
+
+
+def get_shopping_list(user):
+    """Суммарное количество каждого ингредиента из корзины пользователя.
+
+    Читает готовые суммы из ShoppingListItem по индексу (user, ingredient)
+    вместо GROUP BY по рецептам корзины.
+    """
+    return (
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            total_amount=F('amount'),
+        )
+        .order_by('ingredient__name')
+    )
+
+
+def iter_shopping_list_rows(ingredients):
+    for ingredient in ingredients.iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE
+    ):
+        yield (
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['total_amount'],
+        )
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def stream_shopping_list_txt(ingredients):
+    for name, unit, amount in iter_shopping_list_rows(ingredients):
+        yield f"{name} ({unit}) — {amount}\n"
+
+
+def stream_shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPING_LIST_FIELDS)
+    for row in iter_shopping_list_rows(ingredients):
+        yield writer.writerow(row)
+
+
+def stream_shopping_list_json(ingredients):
+    yield "["
+    separator = ""
+    for row in iter_shopping_list_rows(ingredients):
+        yield separator + json.dumps(
+            dict(zip(SHOPPING_LIST_FIELDS, row)), ensure_ascii=False
+        )
+        separator = ","
+    yield "]"
+
+
+# Формат выгрузки -> (Content-Type, генератор строк)
+SHOPPING_LIST_STREAMS = {
+    "txt": ("text/plain; charset=utf-8", stream_shopping_list_txt),
+    "csv": ("text/csv; charset=utf-8", stream_shopping_list_csv),
+    "json": ("application/json", stream_shopping_list_json),
+}
+
+
+def shopping_list_digest(shopping_list):
+    """Хэш содержимого списка покупок — ключ готового PDF и id задачи."""
+    return sha256(
+        json.dumps(shopping_list, ensure_ascii=False, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def get_shopping_list_pdf(user_id, digest):
+    return cache.get(PDF_RESULT_KEY.format(user_id, digest))
+
+
+def store_shopping_list_pdf(user_id, digest, pdf):
+    cache.set(
+        PDF_RESULT_KEY.format(user_id, digest),
+        pdf,
+        settings.SHOPPING_LIST_PDF_CACHE_TIMEOUT,
+    )
+
+
+def get_shopping_list_pdf_status(user_id, digest):
+    """done, pending, failed или None, если задачи не было."""
+    if cache.has_key(PDF_RESULT_KEY.format(user_id, digest)):
+        return PDF_DONE
+    return cache.get(PDF_STATUS_KEY.format(user_id, digest))
+
+
+def enqueue_shopping_list_pdf(user_id, digest, html_string, base_url):
+    """Ставит рендер PDF в пул процессов, если он ещё не поставлен."""
+    status_key = PDF_STATUS_KEY.format(user_id, digest)
+    if cache.get(status_key) == PDF_FAILED:
+        cache.delete(status_key)
+    # cache.add атомарен: повторные нажатия не запускают второй рендер
+    if not cache.add(status_key, PDF_PENDING, settings.PDF_JOB_TIMEOUT):
+        return
+    try:
+        future = pdf_pool.submit(html_string, base_url)
+    except PdfRenderUnavailable:
+        cache.delete(status_key)
+        raise
+    future.add_done_callback(
+        lambda done: _store_shopping_list_pdf_job(user_id, digest, done)
+    )
+
+
+def _store_shopping_list_pdf_job(user_id, digest, future):
+    status_key = PDF_STATUS_KEY.format(user_id, digest)
+    try:
+        pdf, _ = future.result()
+    except Exception:
+        logger.exception("Shopping list PDF %s failed to render", digest)
+        cache.set(status_key, PDF_FAILED, settings.PDF_JOB_TIMEOUT)
+        return
+    store_shopping_list_pdf(user_id, digest, pdf)
+    cache.delete(status_key)
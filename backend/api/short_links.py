@@ -0,0 +1,147 @@
+import atexit
+import logging
+from collections import Counter, OrderedDict
+from threading import Event, Lock, Thread
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, Value, When
+
+from core.models import Recipe, ShortenedRecipeURL
+from core.shortcodes import decode_short_code, is_legacy_code
+
+logger = logging.getLogger(__name__)
+
+
+class ShortLinkCache:
+    """Ограниченный LRU-кэш short_code -> recipe_id для редиректов /s/.
+
+    Общий для всех запросов процесса: попадание обходится без запросов к
+    БД, промах — ровно один запрос. Записи удалённого рецепта
+    вычищаются сигналом (см. api.signals). Несуществующие коды не
+    кэшируются, чтобы рецепт, созданный позже, сразу открывался.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = Lock()
+        self._data = OrderedDict()
+
+    def resolve(self, short_code):
+        with self._lock:
+            recipe_id = self._data.get(short_code)
+            if recipe_id is not None:
+                self._data.move_to_end(short_code)
+                return recipe_id
+        recipe_id = self._load(short_code)
+        if recipe_id is not None:
+            with self._lock:
+                self._data[short_code] = recipe_id
+                if len(self._data) > self.size:
+                    self._data.popitem(last=False)
+        return recipe_id
+
+    @staticmethod
+    def _load(short_code):
+        if is_legacy_code(short_code):
+            return ShortenedRecipeURL.objects.filter(
+                short_code=short_code
+            ).values_list("recipe_id", flat=True).first()
+        recipe_id = decode_short_code(short_code)
+        if recipe_id is None:
+            return None
+        return Recipe.objects.filter(pk=recipe_id).values_list(
+            "pk", flat=True
+        ).first()
+
+    def discard_recipe(self, recipe_id):
+        with self._lock:
+            for code in [
+                code for code, value in self._data.items()
+                if value == recipe_id
+            ]:
+                del self._data[code]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+short_link_cache = ShortLinkCache(settings.SHORT_LINK_CACHE_SIZE)
+
+
+class ClickBuffer:
+    """Копит переходы по коротким ссылкам в памяти процесса.
+
+    Фоновый поток сбрасывает накопленное раз в interval секунд или раньше,
+    когда набралось max_size переходов, одним UPDATE ... CASE на все
+    рецепты. Редирект сам в БД не пишет; счётчик в БД отстаёт не больше
+    чем на interval.
+    """
+
+    def __init__(self, interval, max_size):
+        self.interval = interval
+        self.max_size = max_size
+        self._lock = Lock()
+        self._counts = Counter()
+        self._pending = 0
+        self._wakeup = Event()
+        self._thread = None
+
+    def record(self, recipe_id):
+        with self._lock:
+            self._counts[recipe_id] += 1
+            self._pending += 1
+            full = self._pending >= self.max_size
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wakeup.set()
+
+    def _start(self):
+        self._thread = Thread(
+            target=self._run, name="short-link-clicks", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush short link clicks")
+            finally:
+                connection.close()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._pending = 0
+        if not counts:
+            return 0
+        try:
+            Recipe.objects.filter(pk__in=counts).update(
+                link_clicks=F("link_clicks") + Case(
+                    *(
+                        When(pk=recipe_id, then=Value(clicks))
+                        for recipe_id, clicks in counts.items()
+                    ),
+                    default=Value(0),
+                )
+            )
+        except Exception:
+            # Вернуть в буфер, чтобы не потерять переходы до следующего сброса
+            with self._lock:
+                self._counts.update(counts)
+                self._pending += counts.total()
+            raise
+        return counts.total()
+
+
+click_buffer = ClickBuffer(
+    settings.SHORT_LINK_CLICK_FLUSH_INTERVAL,
+    settings.SHORT_LINK_CLICK_FLUSH_SIZE,
+)
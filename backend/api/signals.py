@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
+                         Subscription, Tag, User)
+from core.signals import bulk_changed
+
+from .authentication import invalidate_token, invalidate_user_tokens
+from .catalog import INGREDIENTS, TAGS, bump_catalog_version
+from .pagination import invalidate_count_cache
+from .short_links import short_link_cache
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def reset_pagination_counts(sender, **kwargs):
+    invalidate_count_cache()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reset_ingredient_catalog(sender, **kwargs):
+    # После коммита: иначе запрос между bump и коммитом закэширует старые
+    # строки под новой версией
+    transaction.on_commit(lambda: bump_catalog_version(INGREDIENTS))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_tag_catalog(sender, **kwargs):
+    transaction.on_commit(lambda: bump_catalog_version(TAGS))
+
+
+@receiver(bulk_changed)
+def reset_after_bulk_change(sender, **kwargs):
+    if sender is Ingredient:
+        reset_ingredient_catalog(sender)
+    elif sender is Tag:
+        reset_tag_catalog(sender)
+    elif sender in (Recipe, FavoriteRecipe, ShoppingCart, Subscription):
+        reset_pagination_counts(sender)
+
+
+@receiver(post_delete, sender=Recipe)
+def reset_short_links(sender, instance, **kwargs):
+    # После коммита: иначе параллельный промах успеет закэшировать id снова
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: short_link_cache.discard_recipe(recipe_id)
+    )
+
+
+@receiver(post_delete, sender=Token)
+def reset_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def reset_cached_user_tokens(sender, instance, created, update_fields=None,
+                             **kwargs):
+    # last_login обновляется при каждом входе и на кэш не влияет
+    if created or update_fields == {"last_login"}:
+        return
+    invalidate_user_tokens(instance.pk)
@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.pagination import invalidate_count_cache
+from core.models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                         ShoppingCart, Tag, User)
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    # count, рецепты с авторами, теги, ингредиенты и для пользователя —
+    # id авторов, на которых он подписан; закэшированный count — минус один
+    ANONYMOUS_QUERIES_COUNT = 4
+    AUTHENTICATED_QUERIES_COUNT = 5
+    PAGE_SIZES = (2, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = Tag.objects.bulk_create(
+            Tag(name=f"Тег {index}", slug=f"tag-{index}")
+            for index in range(3)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {index}", measurement_unit="г")
+            for index in range(5)
+        )
+        cls.user = User.objects.create_user(
+            username="reader", email="reader@example.com",
+            password="password", first_name="Имя", last_name="Фамилия",
+        )
+        authors = [
+            User.objects.create_user(
+                username=f"author{index}",
+                email=f"author{index}@example.com",
+                password="password", first_name="Имя", last_name="Фамилия",
+            )
+            for index in range(3)
+        ]
+        for index in range(8):
+            recipe = Recipe.objects.create(
+                author=authors[index % len(authors)],
+                name=f"Рецепт {index}",
+                image="recipes/images/recipe.png",
+                text="Описание",
+                cooking_time=10,
+            )
+            recipe.tags.set(tags[:2])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in ingredients[:3]
+            )
+            if index % 2:
+                FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION=f"Token {self.token.key}"
+        )
+        # Прогрев кэша токена, чтобы считать только запросы списка
+        self.authenticated.get("/api/users/me/")
+
+    def assert_list_queries(self, client, queries_count):
+        for limit in self.PAGE_SIZES:
+            with self.subTest(limit=limit):
+                invalidate_count_cache()
+                with self.assertNumQueries(queries_count):
+                    response = client.get("/api/recipes/", {"limit": limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data["results"]), limit)
+                with self.assertNumQueries(queries_count - 1):
+                    client.get("/api/recipes/", {"limit": limit})
+
+    def test_anonymous_list(self):
+        self.assert_list_queries(self.anonymous, self.ANONYMOUS_QUERIES_COUNT)
+
+    def test_authenticated_list(self):
+        self.assert_list_queries(
+            self.authenticated, self.AUTHENTICATED_QUERIES_COUNT
+        )
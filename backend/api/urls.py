@@ -6,7 +6,7 @@ from rest_framework.routers import DefaultRouter
 from .serializers import UserSerializer
 from .views import (  # RecipeListView,; RecipeDetailView,
     DownloadShoppingListView, FavoriteView, IngredientViewSet, ReadOnly,
-    RecipeLinkView, RecipeViewSet, ShoppingCartView,
+    RecipeLinkView, RecipeViewSet, ShoppingCartView, ShoppingListJobView,
     SubscribeCreateDestroyView, SubscriptionsListView, TagViewSet,
     UserAvatarUpdateView)
 
@@ -30,6 +30,11 @@ urlpatterns = [
         DownloadShoppingListView.as_view(),
         name='download_shopping_list'
     ),
+    path(
+        'recipes/download_shopping_cart/<str:job_id>/',
+        ShoppingListJobView.as_view(),
+        name='shopping_list_job'
+    ),
     path(
         'recipes/<int:id>/get-link/',
         RecipeLinkView.as_view(),
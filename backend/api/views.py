@@ -1,14 +1,15 @@
-from io import BytesIO
 from urllib.parse import urljoin
 
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.urls import reverse
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from PyPDF2 import PdfMerger
 from rest_framework import filters, generics, status
 from rest_framework.generics import (ListAPIView, RetrieveUpdateDestroyAPIView,
                                      get_object_or_404)
@@ -23,16 +24,22 @@ from core.models import (
     FavoriteRecipe,
     Ingredient,
     Recipe,
-    RecipeIngredient,
     ShoppingCart,
-    ShortenedRecipeURL,
     Subscription,
     Tag
 )
+from .catalog import INGREDIENTS, TAGS, CatalogCacheMixin, ingredient_index
 from .filters import IngredientFilter, RecipeFilterSet
-from .pagination import LimitPagination, SubLimitPagination, paginate_list
+from .pagination import (LimitCursorPagination, LimitPagination,
+                         SubLimitPagination)
 from .permissions import IsAuthorOrReadOnly, ReadOnly
-from .services import pdf_over_template
+from .negotiation import IgnoreFormatContentNegotiation
+from .services import (PDF_DONE, PDF_FAILED, PDF_PENDING,
+                       SHOPPING_LIST_STREAMS, enqueue_shopping_list_pdf,
+                       get_shopping_list, get_shopping_list_pdf,
+                       get_shopping_list_pdf_status, pdf_pool, render_html,
+                       shopping_list_digest, store_shopping_list_pdf)
+from .short_links import click_buffer, short_link_cache
 from .serializers import (AvatarSerializer, FavoriteSerializer,
                           GetOrRetrieveIngredientSerializer,
                           RecipeLinkSerializer, RecipeListOrRetrieveSerializer,
@@ -83,11 +90,29 @@ class SubscriptionsListView(ListAPIView):
     pagination_class = SubLimitPagination
 
     def get_queryset(self):
-        user = self.request.user
-        subscriptions = user.subscriptions.all()
+        # Превью рецептов для всей страницы авторов загружаются одним
+        # запросом: ROW_NUMBER() нумерует рецепты внутри каждого автора,
+        # а фильтр по номеру заменяет срез recipes_limit.
+        recipes = Recipe.objects.annotate(
+            row_number=Window(
+                RowNumber(), partition_by=F("author"), order_by=F("id").asc()
+            )
+        ).order_by("id")
+        limit = self.request.query_params.get("recipes_limit")
+        if limit and limit.isdigit():
+            recipes = recipes.filter(row_number__lte=int(limit))
         return (
-            subscriptions if subscriptions.exists()
-            else Subscription.objects.none()
+            self.request.user.subscriptions
+            .select_related("subscribed_to")
+            .annotate(recipes_count=Count("subscribed_to__recipes"))
+            .prefetch_related(
+                Prefetch(
+                    "subscribed_to__recipes",
+                    queryset=recipes,
+                    to_attr="recipe_previews",
+                )
+            )
+            .order_by("id")
         )
 
 
@@ -160,6 +185,18 @@ class RecipeViewSet(ModelViewSet):
     filterset_fields = ["author", "tags",
                         "is_favorited", "is_in_shopping_cart"]
     permission_classes = [IsAuthorOrReadOnly]
+    pagination_mode_query_param = "pagination"
+
+    @property
+    def paginator(self):
+        # ?pagination=cursor включает keyset-пагинацию; по умолчанию
+        # остаётся постраничная с общим count, нужным фронтенду.
+        mode = self.request.query_params.get(
+            self.pagination_mode_query_param
+        )
+        if mode == "cursor":
+            self.pagination_class = LimitCursorPagination
+        return super().paginator
 
     def get_serializer_class(self):
         if self.action in {"list", "retrieve"}:
@@ -168,44 +205,73 @@ class RecipeViewSet(ModelViewSet):
             return RecipePostOrPatchSerializer
         return super().get_serializer_class()
 
+    def get_queryset(self):
+        queryset = super().get_queryset().with_user_flags(self.request.user)
+        if self.action in {"list", "retrieve"}:
+            # Для update/partial_update предзагрузка не нужна: ингредиенты
+            # пересоздаются, и кэш prefetch оказался бы устаревшим.
+            queryset = queryset.with_related()
+        return queryset
+
 
 class RecipeLinkView(APIView):
     permission_classes = [AllowAny]
 
     @staticmethod
     def get(request, id):
-        try:
-            recipe = Recipe.objects.get(pk=id)
-            if not hasattr(recipe, "shortened_url"):
-                ShortenedRecipeURL.objects.create(recipe=recipe)
-            serializer = RecipeLinkSerializer(
-                recipe, context={"request": request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Recipe.DoesNotExist:
+        # Код вычисляется из id, поэтому ссылка ничего не пишет в БД
+        recipe = Recipe.objects.only("id", "link_clicks").filter(
+            pk=id
+        ).first()
+        if recipe is None:
             return Response(
                 {"detail": "Recipe not found."},
                 status=status.HTTP_404_NOT_FOUND
             )
+        serializer = RecipeLinkSerializer(
+            recipe, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 def redirect_to_original(request, short_code):
-    url = get_object_or_404(ShortenedRecipeURL, short_code=short_code)
+    recipe_id = short_link_cache.resolve(short_code)
+    if recipe_id is None:
+        raise Http404("Recipe not found.")
+    click_buffer.record(recipe_id)
     domain = request.get_host()
 
-    target_url = urljoin(f"http://{domain}/", f"recipes/{url.recipe.id}")
+    target_url = urljoin(f"http://{domain}/", f"recipes/{recipe_id}")
 
     return redirect(target_url)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
+    catalog_label = INGREDIENTS
     queryset = Ingredient.objects.all()
     serializer_class = GetOrRetrieveIngredientSerializer
     filterset_class = IngredientFilter
     permission_classes = [AllowAny]
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.get_catalog_response(
+            self.list_from_index, request, *args, **kwargs
+        )
 
-class TagViewSet(ReadOnlyModelViewSet):
+    @staticmethod
+    def list_from_index(request, *args, **kwargs):
+        # Автодополнение обслуживается из in-memory индекса без запросов к БД
+        limit = request.query_params.get("limit", "")
+        return Response(
+            ingredient_index.search(
+                request.query_params.get("name", ""),
+                limit=int(limit) if limit.isdigit() else None,
+            )
+        )
+
+
+class TagViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
+    catalog_label = TAGS
     queryset = Tag.objects.all()
     permission_classes = [AllowAny]
     serializer_class = TagSerializer
@@ -268,7 +334,9 @@ class ShoppingCartView(CreateModelMixin, DestroyModelMixin, GenericViewSet):
 
         serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(recipe=recipe, user=request.user)
+        with transaction.atomic():
+            # Список покупок обновляется в post_save в той же транзакции
+            serializer.save(recipe=recipe, user=request.user)
 
         headers = self.get_success_headers(serializer.data)
         return Response(
@@ -298,42 +366,129 @@ class ShoppingCartView(CreateModelMixin, DestroyModelMixin, GenericViewSet):
 
 class DownloadShoppingListView(APIView):
     permission_classes = [IsAuthenticated]
+    # ?format= выбирает формат выгрузки, а не рендерер DRF
+    content_negotiation_class = IgnoreFormatContentNegotiation
+    template = 'api/shopping_list_pdf_template.html'
+    rows_per_page = 25
+
+    def get(self, request):
+        export_format = request.query_params.get('format', 'pdf')
+        if export_format != 'pdf' and (
+            export_format not in SHOPPING_LIST_STREAMS
+        ):
+            return Response(
+                {'format': f'Unsupported format "{export_format}".'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        ingredients = get_shopping_list(request.user)
+        time = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"shopping_list_{time}.{export_format}"
+        if export_format == 'pdf':
+            response = self.render_pdf(request, ingredients)
+        else:
+            # Строки агрегата читаются курсором и сразу уходят клиенту,
+            # поэтому память не растёт с размером корзины.
+            content_type, stream = SHOPPING_LIST_STREAMS[export_format]
+            response = StreamingHttpResponse(
+                stream(ingredients), content_type=content_type
+            )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
-    @staticmethod
-    def get(request):
-        template = 'api/shopping_list_pdf_template.html'
-        ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_cart_by__user=request.user)
-            .values('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(total_amount=Sum('amount'))
-            .order_by('ingredient__name')
+    def post(self, request):
+        """Ставит рендер PDF в фоновую очередь и возвращает id задачи.
+
+        id задачи — хэш содержимого списка, поэтому неизменившаяся корзина
+        сразу получает статус done и готовый файл из кэша.
+        """
+        shopping_list = self.get_pdf_rows(get_shopping_list(request.user))
+        digest = shopping_list_digest(shopping_list)
+        if get_shopping_list_pdf(request.user.id, digest) is None:
+            enqueue_shopping_list_pdf(
+                request.user.id,
+                digest,
+                render_html(
+                    request,
+                    self.template,
+                    self.get_pdf_context(shopping_list),
+                ),
+                request.build_absolute_uri('/'),
+            )
+        return ShoppingListJobView.job_response(request, digest)
+
+    def render_pdf(self, request, ingredients):
+        shopping_list = self.get_pdf_rows(ingredients)
+        digest = shopping_list_digest(shopping_list)
+        pdf = get_shopping_list_pdf(request.user.id, digest)
+        if pdf is not None:
+            return HttpResponse(pdf, content_type='application/pdf')
+        # Документ размечается на страницы CSS-разрывами в шаблоне и
+        # рендерится одним проходом в пуле процессов.
+        pdf, render_seconds, total_seconds = pdf_pool.render(
+            render_html(
+                request, self.template, self.get_pdf_context(shopping_list)
+            ),
+            request.build_absolute_uri('/'),
         )
-        page_size = 25
-        paginated_ingredients = paginate_list(ingredients, page_size)
-
-        pdf_merger = PdfMerger()
-
-        for chunk in paginated_ingredients:
-            context = {
-                'shopping_list': [{
-                    'product': ingredient['ingredient__name'],
-                    'amount': ingredient['total_amount'],
-                    'unit': ingredient['ingredient__measurement_unit'],
-                }
-                    for ingredient in chunk
-                ]}
-            pdf_data = pdf_over_template(request, template, context)
-
-            pdf_file = BytesIO(pdf_data['pdf'])
-            pdf_merger.append(pdf_file)
-
-        pdf_output = BytesIO()
-        pdf_merger.write(pdf_output)
-        pdf_merger.close()
-        pdf_output.seek(0)
+        store_shopping_list_pdf(request.user.id, digest, pdf)
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Server-Timing'] = (
+            f'pdf-render;dur={render_seconds * 1000:.1f}, '
+            f'pdf-queue;dur={(total_seconds - render_seconds) * 1000:.1f}'
+        )
+        return response
+
+    @staticmethod
+    def get_pdf_rows(ingredients):
+        return [{
+            'product': ingredient['ingredient__name'],
+            'amount': ingredient['total_amount'],
+            'unit': ingredient['ingredient__measurement_unit'],
+        }
+            for ingredient in ingredients
+        ]
+
+    def get_pdf_context(self, shopping_list):
+        return {
+            'rows_per_page': self.rows_per_page,
+            'shopping_list': shopping_list,
+        }
+
+
+class ShoppingListJobView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        pdf = get_shopping_list_pdf(request.user.id, job_id)
+        if pdf is None:
+            return self.job_response(request, job_id)
         time = timezone.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"shopping_list_{time}.pdf"
-        response = HttpResponse(pdf_output, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response = HttpResponse(pdf, content_type='application/pdf')
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list_{time}.pdf"'
+        )
         return response
+
+    @staticmethod
+    def job_response(request, job_id):
+        job_status = get_shopping_list_pdf_status(request.user.id, job_id)
+        if job_status is None:
+            return Response(
+                {'detail': 'Job not found.'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        codes = {
+            PDF_DONE: status.HTTP_200_OK,
+            PDF_PENDING: status.HTTP_202_ACCEPTED,
+            PDF_FAILED: status.HTTP_500_INTERNAL_SERVER_ERROR,
+        }
+        return Response(
+            {
+                'job_id': job_id,
+                'status': job_status,
+                'url': request.build_absolute_uri(
+                    reverse('api:shopping_list_job', args=[job_id])
+                ),
+            },
+            status=codes[job_status],
+        )
@@ -94,6 +94,59 @@ DATABASES = {
     ),
 }
 
+# Профили подключения к PostgreSQL (DB_PROFILE):
+# default — соединение на каждый запрос; persistent — постоянные
+# соединения с проверкой перед использованием; pooled — клиентский пул
+# psycopg 3 (CONN_MAX_AGE при пуле должен быть 0). Django выбирает psycopg 3,
+# когда он установлен, поэтому во всех профилях работает он, а не psycopg2.
+DB_STATEMENT_OPTIONS = {
+    "options": "-c statement_timeout={}".format(
+        int(os.getenv("DB_STATEMENT_TIMEOUT", 30_000))
+    ),
+}
+
+DB_PROFILES = {
+    "default": {},
+    "persistent": {
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": DB_STATEMENT_OPTIONS,
+    },
+    "pooled": {
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {
+            **DB_STATEMENT_OPTIONS,
+            "pool": {
+                "min_size": int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+                "timeout": int(os.getenv("DB_POOL_TIMEOUT", 10)),
+            },
+        },
+    },
+}
+
+if DATABASES["default"]["ENGINE"] == DB_SWITCH["postgresql"]["ENGINE"]:
+    DATABASES["default"] = {
+        **DATABASES["default"],
+        **DB_PROFILES.get(os.getenv("DB_PROFILE", "default"), {}),
+    }
+
+CACHE_SWITCH = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379"),
+    },
+}
+
+CACHES = {
+    "default": CACHE_SWITCH.get(
+        os.getenv("CACHE_ENGINE", "locmem"), CACHE_SWITCH["locmem"]
+    ),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME":
@@ -135,7 +188,7 @@ AUTH_USER_MODEL = "core.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
@@ -149,6 +202,54 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 6,
 }
 
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", 60))
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = int(
+    os.getenv("AUTH_TOKEN_LOCAL_CACHE_TIMEOUT", 5)
+)
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(
+    os.getenv("AUTH_TOKEN_LOCAL_CACHE_SIZE", 10000)
+)
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv("PAGINATION_COUNT_CACHE_TIMEOUT", 30)
+)
+PAGINATION_ESTIMATE_COUNT = (
+    os.getenv("PAGINATION_ESTIMATE_COUNT", "false").lower() == "true"
+)
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 60 * 60 * 24))
+# Срок версии каталога в кэше процесса (locmem), см. api.catalog
+CATALOG_VERSION_TIMEOUT = int(os.getenv("CATALOG_VERSION_TIMEOUT", 60))
+
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv("IMAGE_UPLOAD_MAX_SIZE", 7 * 1024 * 1024))
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", 40_000_000))
+IMAGE_UPLOAD_SPOOL_SIZE = int(os.getenv("IMAGE_UPLOAD_SPOOL_SIZE", 1024 * 1024))
+IMAGE_UPLOAD_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+IMAGE_VARIANTS = {
+    "thumb": (320, 320),
+    "medium": (800, 800),
+}
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", 2))
+FILE_CLEANUP_BATCH_SIZE = int(os.getenv("FILE_CLEANUP_BATCH_SIZE", 100))
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv("SHORT_LINK_CACHE_SIZE", 10000))
+SHORT_LINK_CLICK_FLUSH_INTERVAL = int(
+    os.getenv("SHORT_LINK_CLICK_FLUSH_INTERVAL", 10)
+)
+SHORT_LINK_CLICK_FLUSH_SIZE = int(
+    os.getenv("SHORT_LINK_CLICK_FLUSH_SIZE", 500)
+)
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", 2))
+PDF_RENDER_QUEUE_SIZE = int(os.getenv("PDF_RENDER_QUEUE_SIZE", 8))
+PDF_RENDER_TIMEOUT = int(os.getenv("PDF_RENDER_TIMEOUT", 30))
+PDF_RENDER_RETRY_AFTER = int(os.getenv("PDF_RENDER_RETRY_AFTER", 5))
+PDF_JOB_TIMEOUT = int(os.getenv("PDF_JOB_TIMEOUT", 5 * 60))
+SHOPPING_LIST_PDF_CACHE_TIMEOUT = int(
+    os.getenv("SHOPPING_LIST_PDF_CACHE_TIMEOUT", 60 * 60)
+)
+
 DJOSER = {
     "LOGIN_FIELD": "email",
     "SERIALIZERS": {
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.db.models import Count
 
 from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Subscription, Tag, User)
+                     ShoppingCart, ShoppingListItem, Subscription, Tag, User)
 
 
 @admin.register(User)
@@ -21,7 +21,11 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'cooking_time', 'times_favorited')
+    list_display = (
+        'id', 'name', 'author', 'cooking_time', 'times_favorited',
+        'link_clicks',
+    )
+    readonly_fields = ('link_clicks',)
     search_fields = ('name', 'author__username')
     list_filter = ('tags', 'author')
     raw_id_fields = ('author',)
@@ -68,3 +72,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'recipe', 'user')
     search_fields = ('recipe__name', 'user__username')
     raw_id_fields = ('recipe', 'user')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    raw_id_fields = ('user', 'ingredient')
@@ -0,0 +1,74 @@
+"""Отложенное удаление файлов из хранилища.
+
+Сигналы моделей только ставят имена в очередь после коммита транзакции;
+удаляет их фоновый поток пачками. Откат транзакции не теряет файлы, а
+массовое удаление рецептов не ждёт файловой системы.
+"""
+import atexit
+import logging
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .images import variant_names
+
+logger = logging.getLogger(__name__)
+
+
+class FileCleanupQueue:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self._queue = SimpleQueue()
+        self._lock = Lock()
+        self._thread = None
+
+    def put(self, names):
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="file-cleanup", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.drain)
+        for name in names:
+            self._queue.put(name)
+
+    def _next_batch(self, block=True):
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            self.delete(self._next_batch())
+
+    def drain(self):
+        """Удаляет всё, что осталось в очереди, в текущем потоке."""
+        while batch := self._next_batch(block=False):
+            self.delete(batch)
+
+    @staticmethod
+    def delete(names):
+        for name in names:
+            try:
+                default_storage.delete(name)
+            except Exception:
+                logger.exception("Failed to delete file %s", name)
+
+
+cleanup_queue = FileCleanupQueue(settings.FILE_CLEANUP_BATCH_SIZE)
+
+
+def queue_file_cleanup(name):
+    """Удаляет файл и его варианты после успешного коммита."""
+    names = [name, *variant_names(name)]
+    transaction.on_commit(lambda: cleanup_queue.put(names))
@@ -0,0 +1,93 @@
+"""Уменьшенные копии изображений рецептов и аватаров.
+
+Для каждого загруженного файла строятся варианты из IMAGE_VARIANTS в WebP
+и JPEG (запасной формат для старых браузеров). Варианты лежат в
+MEDIA_ROOT/variants/ рядом с путём оригинала, поэтому их URL вычисляется
+по имени файла без запросов к БД и хранилищу, а nginx отдаёт их с
+долгим кэшированием: имя загруженного файла уникально и не меняется.
+"""
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = "variants"
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_WORKERS,
+    thread_name_prefix="image-variants",
+)
+
+
+def variant_name(name, variant, ext):
+    root, _ = posixpath.splitext(name)
+    return posixpath.join(VARIANTS_DIR, f"{root}.{variant}.{ext}")
+
+
+def variant_names(name):
+    return [
+        variant_name(name, variant, ext)
+        for variant in settings.IMAGE_VARIANTS
+        for ext in VARIANT_FORMATS
+    ]
+
+
+def has_variants(name):
+    return default_storage.exists(variant_names(name)[-1])
+
+
+def variant_urls(name):
+    """{"thumb": {"webp": url, "jpeg": url}, ...} или None без файла."""
+    if not name:
+        return None
+    return {
+        variant: {
+            ext: default_storage.url(variant_name(name, variant, ext))
+            for ext in VARIANT_FORMATS
+        }
+        for variant in settings.IMAGE_VARIANTS
+    }
+
+
+def generate_variants(name):
+    with default_storage.open(name, "rb") as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original = original.convert("RGB")
+    for variant, size in settings.IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+        for ext, image_format in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            image.save(
+                buffer,
+                image_format,
+                quality=settings.IMAGE_VARIANT_QUALITY,
+                optimize=True,
+            )
+            path = variant_name(name, variant, ext)
+            # save() переименовал бы файл, если он уже существует
+            default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def _generate_variants_safely(name):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception("Failed to generate image variants for %s", name)
+
+
+def schedule_variants(name):
+    """Строит варианты в фоновом потоке после коммита транзакции."""
+    transaction.on_commit(
+        lambda: _executor.submit(_generate_variants_safely, name)
+    )
@@ -0,0 +1,223 @@
+"""Массовая загрузка справочников из JSON, NDJSON и CSV.
+
+Строки сопоставляются с существующими по натуральному ключу: вся таблица
+читается одним запросом, дальше новые записи вставляются bulk_create, а
+изменённые обновляются bulk_update пачками внутри одной транзакции.
+"""
+import csv
+import json
+from itertools import chain, islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from .signals import bulk_changed
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file, fields=None):
+    """Объекты JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise json.JSONDecodeError('Expected "["', buffer, 0)
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().removeprefix(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            # Объект оборван на границе куска — дочитываем
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_ndjson(file, fields=None):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file, fields):
+    """CSV с заголовком или без него (тогда колонки идут в порядке
+    fields)."""
+    rows = csv.reader(file)
+    header = next(rows, None)
+    if header is None:
+        return
+    if set(header) >= set(fields):
+        columns = header
+    else:
+        columns = fields
+        rows = chain([header], rows)
+    for row in rows:
+        if not row:
+            continue
+        if len(row) != len(columns):
+            raise ValueError(f'expected {len(columns)} columns: {row}')
+        yield dict(zip(columns, row))
+
+
+READERS = {'json': iter_json_array, 'ndjson': iter_ndjson, 'csv': iter_csv}
+
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+class BulkImporter:
+    """Загружает записи model, сопоставляя их по key_fields.
+
+    Поля fields обновляются у существующих записей; записи, которых нет в
+    файле, не трогаются. С dry_run ничего не пишет, а только собирает
+    diff.
+    """
+
+    def __init__(self, model, key_fields, fields, batch_size=1000,
+                 dry_run=False):
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.fields = tuple(fields)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+        self.diff = []
+
+    def load_existing(self):
+        columns = self.key_fields + self.fields
+        return {
+            tuple(row[1:len(self.key_fields) + 1]): row
+            for row in self.model.objects.values_list(
+                'pk', *columns
+            ).iterator()
+        }
+
+    def run(self, items):
+        existing = self.load_existing()
+        seen = set()
+        with transaction.atomic():
+            while batch := list(islice(items, self.batch_size)):
+                self.apply(batch, existing, seen)
+        return self.counts
+
+    def apply(self, batch, existing, seen):
+        to_create, to_update = [], []
+        for item in batch:
+            key = tuple(_clean(item[field]) for field in self.key_fields)
+            values = {field: _clean(item[field]) for field in self.fields}
+            if key in seen:
+                self.counts['skipped'] += 1
+                continue
+            seen.add(key)
+            row = existing.get(key)
+            if row is None:
+                to_create.append(self.model(
+                    **dict(zip(self.key_fields, key)), **values
+                ))
+                if self.dry_run:
+                    self.diff.append(('+', key, values))
+                continue
+            old = dict(zip(self.fields, row[len(self.key_fields) + 1:]))
+            changed = {
+                field: value for field, value in values.items()
+                if old[field] != value
+            }
+            if not changed:
+                self.counts['skipped'] += 1
+                continue
+            to_update.append(self.model(pk=row[0], **values))
+            if self.dry_run:
+                self.diff.append((
+                    '~', key,
+                    {field: (old[field], value)
+                     for field, value in changed.items()},
+                ))
+        self.counts['inserted'] += len(to_create)
+        self.counts['updated'] += len(to_update)
+        if self.dry_run:
+            return
+        self.model.objects.bulk_create(to_create)
+        if self.fields:
+            self.model.objects.bulk_update(to_update, self.fields)
+
+
+class BaseImportCommand(BaseCommand):
+    """Команда загрузки справочника: model, key_fields и fields задаются
+    в наследнике."""
+
+    model = None
+    key_fields = ()
+    fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=str,
+                            help='JSON, NDJSON or CSV files to load')
+        parser.add_argument('--format', choices=READERS,
+                            help='Input format; defaults to file extension')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows per bulk query')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the diff without writing')
+
+    def handle(self, *args, **kwargs):
+        for path in map(Path, kwargs['paths']):
+            self.import_file(path, kwargs)
+
+    def import_file(self, path, options):
+        name = self.model.__name__
+        reader = READERS.get(
+            options['format'] or path.suffix.lstrip('.').lower()
+        )
+        if reader is None:
+            self.stdout.write(self.style.ERROR(
+                f'{path}: unknown file format, use --format.'))
+            return
+        importer = BulkImporter(
+            self.model,
+            self.key_fields,
+            self.fields,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        columns = self.key_fields + self.fields
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                counts = importer.run(reader(file, columns))
+        except FileNotFoundError:
+            self.stdout.write(self.style.ERROR(f'{path}: file not found.'))
+            return
+        except json.JSONDecodeError as e:
+            self.stdout.write(self.style.ERROR(
+                f'{path}: error decoding JSON: {e}'))
+            return
+        except (csv.Error, KeyError, ValueError, IntegrityError) as e:
+            self.stdout.write(self.style.ERROR(
+                f'{path}: invalid row: {e}'))
+            return
+        if options['dry_run']:
+            for sign, key, values in importer.diff:
+                self.stdout.write(f'{sign} {", ".join(map(str, key))} '
+                                  f'{values}')
+        else:
+            self.after_import()
+        self.stdout.write(self.style.SUCCESS(
+            '{name}: {inserted} inserted, {updated} updated, '
+            '{skipped} skipped{dry}.'.format(
+                name=name,
+                dry=' (dry run)' if options['dry_run'] else '',
+                **counts,
+            )))
+
+    def after_import(self):
+        """Bulk-операции не шлют сигналы моделей — сообщаем об изменении
+        одним сигналом на файл."""
+        bulk_changed.send(sender=self.model)
@@ -0,0 +1,88 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+
+def simulate_request(query):
+    """Жизненный цикл соединения как у запроса: close_old_connections
+    на request_started/request_finished и один запрос к БД."""
+    request_started.send(sender=simulate_request)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            cursor.fetchall()
+    finally:
+        request_finished.send(sender=simulate_request)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request latency with and without persistent DB "
+        "connections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, default=200,
+            help="Simulated requests per mode"
+        )
+        parser.add_argument(
+            "--query", default="SELECT 1",
+            help="Query executed by every simulated request"
+        )
+
+    def handle(self, *args, **kwargs):
+        settings_dict = connection.settings_dict
+        configured = (
+            settings_dict["CONN_MAX_AGE"],
+            settings_dict["CONN_HEALTH_CHECKS"],
+            settings_dict["OPTIONS"],
+        )
+        # Базовый режим без пула: иначе оба замера шли бы через него
+        unpooled = {
+            key: value for key, value in configured[2].items()
+            if key != "pool"
+        }
+        modes = (
+            ("connect per request", 0, False, unpooled),
+            ("configured profile", *configured),
+        )
+        self.stdout.write(
+            f"{connection.vendor}: CONN_MAX_AGE={configured[0]} "
+            f"CONN_HEALTH_CHECKS={configured[1]} "
+            f"pool={'pool' in configured[2]}"
+        )
+        try:
+            for name, max_age, health_checks, options in modes:
+                settings_dict["CONN_MAX_AGE"] = max_age
+                settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+                settings_dict["OPTIONS"] = options
+                connection.close()
+                timings = self.measure(kwargs["query"], kwargs["iterations"])
+                self.stdout.write(
+                    f"{name:<20} mean {statistics.fmean(timings):>7.2f} ms  "
+                    f"p50 {statistics.median(timings):>7.2f} ms  "
+                    f"p95 {self.percentile(timings, 95):>7.2f} ms"
+                )
+        finally:
+            (settings_dict["CONN_MAX_AGE"],
+             settings_dict["CONN_HEALTH_CHECKS"],
+             settings_dict["OPTIONS"]) = configured
+            connection.close()
+
+    @staticmethod
+    def measure(query, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            simulate_request(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    @staticmethod
+    def percentile(values, percent):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
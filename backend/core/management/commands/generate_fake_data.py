@@ -0,0 +1,302 @@
+import os
+import random
+import time
+from io import BytesIO
+from itertools import accumulate, islice
+
+from core.images import generate_variants, has_variants, variant_names
+from core.models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                         ShoppingCart, ShoppingListItem, Subscription, Tag,
+                         User)
+from core.signals import bulk_changed
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+PLACEHOLDER_NAME = 'recipes/images/placeholders/placeholder_{}.jpg'
+FAKE_IMAGE_NAME = 'recipes/images/fake_{:032x}.jpg'
+PLACEHOLDER_SIZE = (800, 600)
+FAKE_PASSWORD = 'fake-password'
+
+
+def bulk_insert(model, objects, batch_size):
+    """bulk_create пачками из генератора; возвращает созданные объекты."""
+    objects = iter(objects)
+    created = []
+    while batch := list(islice(objects, batch_size)):
+        created.extend(model.objects.bulk_create(batch))
+    return created
+
+
+def link_file(source, name):
+    """Жёсткая ссылка name на source; копия, если хранилище не локальное.
+
+    Своё имя у каждого рецепта позволяет удалять его картинку, не трогая
+    остальные, а ссылка не занимает места на диске.
+    """
+    try:
+        source_path = default_storage.path(source)
+        path = default_storage.path(name)
+    except NotImplementedError:
+        if not default_storage.exists(name):
+            with default_storage.open(source) as file:
+                default_storage.save(name, file)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.link(source_path, path)
+    except FileExistsError:
+        pass
+
+
+class Popularity:
+    """Выбор элементов по закону Ципфа.
+
+    При skew=0 выбор равномерный; чем больше skew, тем чаще выпадают
+    популярные элементы. Ранги раздаются в случайном порядке, а
+    накопленные веса считаются один раз, так что выборка стоит
+    O(count * log n).
+    """
+
+    def __init__(self, rng, population, skew):
+        self.rng = rng
+        self.population = rng.sample(population, len(population))
+        self.cum_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(population) + 1)
+        )) if skew and population else None
+
+    def sample(self, count, exclude=None):
+        """До count различных элементов, кроме exclude."""
+        chosen = []
+        if not self.population:
+            return chosen
+        for _ in range(3):
+            if self.cum_weights is None:
+                candidates = self.rng.sample(
+                    self.population, min(count + 1, len(self.population))
+                )
+            else:
+                candidates = self.rng.choices(
+                    self.population, cum_weights=self.cum_weights,
+                    k=count + 1,
+                )
+            for item in candidates:
+                if item != exclude and item not in chosen:
+                    chosen.append(item)
+                    if len(chosen) == count:
+                        return chosen
+        return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a reproducible synthetic dataset of users, recipes, '
+        'subscriptions, favorites and shopping carts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes-per-user', type=int, default=5,
+                            help='Mean recipes per user (uniform 0..2x)')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--tags', type=int, default=10,
+                            help='Minimal number of tags, missing are '
+                                 'created')
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=10)
+        parser.add_argument('--cart-per-user', type=int, default=3)
+        parser.add_argument('--skew', type=float, default=1.0,
+                            help='Zipf exponent for popular authors and '
+                                 'recipes; 0 is uniform')
+        parser.add_argument('--images', type=int, default=8,
+                            help='Number of shared placeholder images')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError(
+                'Not enough ingredients, run load_ingredients first.')
+        images = self.stage('placeholders', self.make_placeholders,
+                            options['images'])
+        with transaction.atomic():
+            tag_ids = self.stage('tags', self.make_tags, options['tags'])
+            users = self.stage('users', self.make_users, options['users'])
+            recipe_ids = self.stage(
+                'recipes', self.make_recipes, users, images, options
+            )
+            self.stage('recipe ingredients', self.make_recipe_ingredients,
+                       recipe_ids, ingredient_ids,
+                       options['ingredients_per_recipe'])
+            self.stage('recipe tags', self.make_recipe_tags, recipe_ids,
+                       tag_ids, options['tags_per_recipe'])
+            self.stage('subscriptions', self.make_subscriptions, users,
+                       options['subscriptions_per_user'], options['skew'])
+            self.stage('favorites', self.make_user_recipes, FavoriteRecipe,
+                       users, recipe_ids, options['favorites_per_user'],
+                       options['skew'])
+            self.stage('shopping carts', self.make_user_recipes,
+                       ShoppingCart, users, recipe_ids,
+                       options['cart_per_user'], options['skew'])
+            self.stage('shopping lists', self.rebuild_shopping_lists, users)
+        # bulk_create не шлёт сигналы моделей
+        for model in (Tag, Recipe, FavoriteRecipe, ShoppingCart,
+                      Subscription):
+            bulk_changed.send(sender=model)
+        self.stdout.write(self.style.SUCCESS('Fake data generated.'))
+
+    def stage(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        size = result if isinstance(result, int) else len(result)
+        self.stdout.write(
+            f'{name:<20} {size:>10}  {time.perf_counter() - start:>8.2f} s'
+        )
+        return result
+
+    def make_placeholders(self, count):
+        """Несколько общих картинок вместо файла на каждый рецепт."""
+        names = []
+        for index in range(count):
+            name = PLACEHOLDER_NAME.format(index)
+            if not default_storage.exists(name):
+                color = tuple(self.rng.randrange(64, 224) for _ in range(3))
+                image = Image.new('RGB', PLACEHOLDER_SIZE, color)
+                buffer = BytesIO()
+                image.save(buffer, 'JPEG', quality=70)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            if not has_variants(name):
+                generate_variants(name)
+            names.append(name)
+        return names
+
+    def link_image(self, placeholder):
+        """Собственное имя картинки рецепта: ссылка на заглушку и её
+        варианты."""
+        name = FAKE_IMAGE_NAME.format(self.rng.getrandbits(128))
+        for source, target in zip(
+            [placeholder, *variant_names(placeholder)],
+            [name, *variant_names(name)],
+        ):
+            link_file(source, target)
+        return name
+
+    def make_tags(self, count):
+        missing = count - Tag.objects.count()
+        start = Tag.objects.filter(slug__startswith='fake-tag-').count()
+        bulk_insert(
+            Tag,
+            (
+                Tag(name=f'Fake tag {index}', slug=f'fake-tag-{index}')
+                for index in range(start, start + max(missing, 0))
+            ),
+            self.batch_size,
+        )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def make_users(self, count):
+        # Хэш один на всех: PBKDF2 на каждого пользователя занял бы минуты
+        password = make_password(FAKE_PASSWORD)
+        start = User.objects.filter(username__startswith='fake_').count()
+        return bulk_insert(
+            User,
+            (
+                User(
+                    username=f'fake_{index}',
+                    email=f'fake_{index}@example.com',
+                    first_name=f'Имя{index}',
+                    last_name=f'Фамилия{index}',
+                    password=password,
+                )
+                for index in range(start, start + count)
+            ),
+            self.batch_size,
+        )
+
+    def make_recipes(self, users, images, options):
+        mean = options['recipes_per_user']
+
+        def recipes():
+            for user in users:
+                for index in range(self.rng.randint(0, 2 * mean)):
+                    yield Recipe(
+                        author=user,
+                        name=f'Рецепт {index} от {user.username}',
+                        image=self.link_image(self.rng.choice(images)),
+                        text='Синтетический рецепт для нагрузочных тестов.',
+                        cooking_time=self.rng.randint(5, 240),
+                    )
+
+        return [
+            recipe.id
+            for recipe in bulk_insert(Recipe, recipes(), self.batch_size)
+        ]
+
+    def make_recipe_ingredients(self, recipe_ids, ingredient_ids, count):
+        return bulk_insert(
+            RecipeIngredient,
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.rng.sample(ingredient_ids, count)
+            ),
+            self.batch_size,
+        )
+
+    def make_recipe_tags(self, recipe_ids, tag_ids, count):
+        through = Recipe.tags.through
+        return bulk_insert(
+            through,
+            (
+                through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.rng.sample(
+                    tag_ids, min(count, len(tag_ids))
+                )
+            ),
+            self.batch_size,
+        )
+
+    def make_subscriptions(self, users, count, skew):
+        authors = Popularity(self.rng, [user.id for user in users], skew)
+        return bulk_insert(
+            Subscription,
+            (
+                Subscription(user=user, subscribed_to_id=author_id)
+                for user in users
+                for author_id in authors.sample(count, exclude=user.id)
+            ),
+            self.batch_size,
+        )
+
+    def make_user_recipes(self, model, users, recipe_ids, count, skew):
+        recipes = Popularity(self.rng, recipe_ids, skew)
+        return bulk_insert(
+            model,
+            (
+                model(user=user, recipe_id=recipe_id)
+                for user in users
+                for recipe_id in recipes.sample(count)
+            ),
+            self.batch_size,
+        )
+
+    def rebuild_shopping_lists(self, users):
+        user_ids = iter([user.id for user in users])
+        created = 0
+        while batch := list(islice(user_ids, self.batch_size)):
+            created += ShoppingListItem.objects.rebuild(batch)
+        return created
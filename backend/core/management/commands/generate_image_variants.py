@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants, has_variants
+from core.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = "Generate resized image variants for existing recipes and avatars"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate variants that already exist"
+        )
+
+    def handle(self, *args, **kwargs):
+        names = list(
+            Recipe.objects.exclude(image="").values_list("image", flat=True)
+        ) + list(
+            User.objects.exclude(avatar="").exclude(avatar=None)
+            .values_list("avatar", flat=True)
+        )
+        generated = failed = 0
+        for name in names:
+            if not kwargs["force"] and has_variants(name):
+                continue
+            try:
+                generate_variants(name)
+                generated += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"{name}: {e}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {generated} images, {failed} failed."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = "Rebuild aggregated shopping lists from shopping carts"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            nargs="*",
+            dest="user_ids",
+            help="Only rebuild lists of the given user ids"
+        )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            created = ShoppingListItem.objects.rebuild(kwargs["user_ids"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt shopping lists: {created} items."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='link_clicks',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Переходы по ссылке'),
+        ),
+    ]
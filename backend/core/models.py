@@ -1,18 +1,62 @@
-import os
 import random
 import string
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models.signals import post_delete, pre_save
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .cleanup import queue_file_cleanup
+from .images import schedule_variants
 from .validators import validate_username
 
 
-class User(AbstractUser):
+def _file_name(value):
+    return getattr(value, "name", value) or ""
+
+
+class TrackedFilesMixin:
+    """Помнит имена файлов, прочитанные из БД.
+
+    По ним после сохранения видно, какой файл заменён, без повторного
+    SELECT старой строки.
+    """
+
+    tracked_file_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_files()
+        return instance
+
+    def remember_files(self):
+        # Отложенные (defer/only) поля не попадают в __dict__
+        self._stored_files = {
+            field_name: _file_name(self.__dict__[field_name])
+            for field_name in self.tracked_file_fields
+            if field_name in self.__dict__
+        }
+
+    def changed_files(self, update_fields=None):
+        """[(старое имя, новое имя)] для изменившихся файловых полей."""
+        stored = getattr(self, "_stored_files", {})
+        changes = []
+        for field_name in self.tracked_file_fields:
+            if update_fields is not None and field_name not in update_fields:
+                continue
+            if field_name not in self.__dict__:
+                continue
+            old_name = stored.get(field_name, "")
+            new_name = _file_name(self.__dict__[field_name])
+            if old_name != new_name:
+                changes.append((old_name, new_name))
+        return changes
+
+
+class User(TrackedFilesMixin, AbstractUser):
     email = models.EmailField(
         unique=True,
         max_length=settings.MAX_LENGTH_EMAIL,
@@ -37,6 +81,8 @@ class User(AbstractUser):
         default=None,
     )
 
+    tracked_file_fields = ("avatar",)
+
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
@@ -99,7 +145,39 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Аннотирует is_favorited и is_in_shopping_cart для пользователя."""
+        if not user or not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=models.Exists(
+                FavoriteRecipe.objects.filter(
+                    user=user, recipe=models.OuterRef("pk")
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef("pk")
+                )
+            ),
+        )
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты фиксированным числом
+        запросов независимо от размера выборки."""
+        return self.select_related("author").prefetch_related(
+            "tags",
+            models.Prefetch(
+                "ingredients",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
+
+
+class Recipe(TrackedFilesMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -117,6 +195,13 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag, related_name="recipes", verbose_name="Теги"
     )
+    link_clicks = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Переходы по ссылке"
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    tracked_file_fields = ("image",)
 
     class Meta:
         unique_together = ("author", "name")
@@ -242,47 +327,192 @@ class ShoppingCart(models.Model):
         return f"{self.user.username} -> " f"{self.recipe.name}"
 
 
-@receiver(models.signals.post_delete, sender=Recipe)
-def auto_delete_file_on_delete(sender, instance, **kwargs):
-    if instance.image:
-        if os.path.isfile(instance.image.path):
-            os.remove(instance.image.path)
+class ShoppingListItemManager(models.Manager):
+    """Поддерживает агрегированный список покупок в актуальном состоянии.
 
+    Все методы рассчитаны на вызов внутри transaction.atomic вместе с
+    изменением корзины или ингредиентов рецепта.
+    """
 
-@receiver(pre_save, sender=Recipe)
-def auto_delete_file_on_change(sender, instance, **kwargs):
-    if not instance.pk:
-        return False
+    @staticmethod
+    def recipe_amounts(recipe_id):
+        return dict(
+            RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+                "ingredient_id", "amount"
+            )
+        )
+
+    def add_recipe(self, user_id, recipe_id):
+        self.apply_deltas([user_id], self.recipe_amounts(recipe_id))
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.apply_deltas(
+            [user_id],
+            {
+                ingredient_id: -amount
+                for ingredient_id, amount in self.recipe_amounts(
+                    recipe_id
+                ).items()
+            },
+        )
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта на всех, у кого он в
+        корзине."""
+        deltas = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in old_amounts.keys() | new_amounts.keys()
+        }
+        user_ids = list(
+            ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+                "user_id", flat=True
+            )
+        )
+        self.apply_deltas(user_ids, deltas)
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas {ingredient_id: количество} к спискам
+        пользователей; строки с нулевым остатком удаляются."""
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not user_ids or not deltas:
+            return
+        # Недостающие строки создаются заранее с нулём: параллельная
+        # вставка той же строки ждёт на уникальном индексе и пропускается,
+        # а не падает с IntegrityError. Дальше все строки под блокировкой.
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=0)
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=deltas
+            )
+        }
+        to_update, to_delete = [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = items.get((user_id, ingredient_id))
+                if item is None:
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+        self.bulk_update(to_update, ["amount"])
+        self.filter(pk__in=to_delete).delete()
+
+    def rebuild(self, user_ids=None):
+        """Пересчитывает списки с нуля по корзинам; None — для всех."""
+        # Один вызов filter(), чтобы не получить второй JOIN по корзинам
+        lookup = {"recipe__shopping_cart_by__isnull": False}
+        stale = self.all()
+        if user_ids is not None:
+            lookup = {"recipe__shopping_cart_by__user_id__in": user_ids}
+            stale = stale.filter(user_id__in=user_ids)
+        totals = (
+            RecipeIngredient.objects.filter(**lookup)
+            .values("recipe__shopping_cart_by__user_id", "ingredient_id")
+            .annotate(total=models.Sum("amount"))
+            .order_by()
+        )
+        stale.delete()
+        return len(self.bulk_create(
+            (
+                self.model(
+                    user_id=row["recipe__shopping_cart_by__user_id"],
+                    ingredient_id=row["ingredient_id"],
+                    amount=row["total"],
+                )
+                for row in totals.iterator()
+            ),
+            batch_size=1000,
+        ))
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list_items",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField(verbose_name="Кол-во")
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        unique_together = ("user", "ingredient")
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Списки покупок"
+
+    def __str__(self):
+        return f"{self.user} -> {self.amount} of {self.ingredient}"
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_lists(sender, instance, **kwargs):
+    # До удаления: каскад сначала стирает ингредиенты рецепта. Все корзины
+    # с рецептом правятся одним проходом, см. remove_from_shopping_list.
+    ShoppingListItem.objects.change_recipe(
+        instance.id, ShoppingListItem.objects.recipe_amounts(instance.id), {}
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        # Без транзакции у вызывающего select_for_update работать не будет
+        with transaction.atomic(savepoint=False):
+            ShoppingListItem.objects.add_recipe(
+                instance.user_id, instance.recipe_id
+            )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, origin=None, **kwargs):
+    # При удалении рецепта списки уже поправлены в
+    # remove_recipe_from_shopping_lists
+    if getattr(origin, "model", type(origin)) is Recipe:
+        return
+    ShoppingListItem.objects.remove_recipe(
+        instance.user_id, instance.recipe_id
+    )
 
-    try:
-        old_file = Recipe.objects.get(pk=instance.pk).image
-    except Recipe.DoesNotExist:
-        return False
 
-    new_file = instance.image
-    if old_file and old_file != new_file:
-        if os.path.isfile(old_file.path):
-            os.remove(old_file.path)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def handle_replaced_files(sender, instance, update_fields=None, **kwargs):
+    for old_name, new_name in instance.changed_files(update_fields):
+        if old_name:
+            queue_file_cleanup(old_name)
+        if new_name:
+            schedule_variants(new_name)
+    instance.remember_files()
 
 
 @receiver(post_delete, sender=Recipe)
-def auto_user_delete_image_on_delete(sender, instance, **kwargs):
-    if instance.image:
-        if os.path.isfile(instance.image.path):
-            os.remove(instance.image.path)
-
-
-@receiver(pre_save, sender=User)
-def auto_delete_avatar_on_change(sender, instance, **kwargs):
-    if not instance.pk:
-        return False
-
-    try:
-        old_file = User.objects.get(pk=instance.pk).avatar
-    except User.DoesNotExist:
-        return False
-
-    new_file = instance.avatar
-    if old_file and old_file != new_file:
-        if os.path.isfile(old_file.path):
-            os.remove(old_file.path)
+@receiver(post_delete, sender=User)
+def delete_files_on_delete(sender, instance, **kwargs):
+    for field_name in sender.tracked_file_fields:
+        file = getattr(instance, field_name)
+        if file:
+            queue_file_cleanup(file.name)
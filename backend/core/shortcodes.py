@@ -0,0 +1,59 @@
+"""Детерминированные короткие коды рецептов.
+
+Код — это base62 от id, перемешанного обратимым аффинным преобразованием
+по модулю 62**6, плюс символ контрольной суммы. Код вычисляется и
+раскодируется без обращения к БД и не может совпасть с другим рецептом.
+Старые случайные коды из ShortenedRecipeURL имеют длину 6 и поэтому не
+пересекаются с новыми (длина 7).
+"""
+import string
+
+ALPHABET = string.digits + string.ascii_letters
+BASE = len(ALPHABET)
+BODY_LENGTH = 6
+CODE_LENGTH = BODY_LENGTH + 1
+MODULUS = BASE ** BODY_LENGTH
+
+# Множитель взаимно прост с 62**6, поэтому преобразование обратимо
+MULTIPLIER = 35_104_476_157
+OFFSET = 9_217_450_313
+INVERSE = pow(MULTIPLIER, -1, MODULUS)
+
+_INDEX = {char: index for index, char in enumerate(ALPHABET)}
+
+
+def _checksum(body):
+    return ALPHABET[
+        sum((position + 1) * _INDEX[char]
+            for position, char in enumerate(body)) % BASE
+    ]
+
+
+def encode_recipe_id(recipe_id):
+    if not 0 < recipe_id < MODULUS:
+        raise ValueError(f"Recipe id {recipe_id} is out of range.")
+    value = (recipe_id * MULTIPLIER + OFFSET) % MODULUS
+    body = []
+    for _ in range(BODY_LENGTH):
+        value, digit = divmod(value, BASE)
+        body.append(ALPHABET[digit])
+    body = "".join(reversed(body))
+    return body + _checksum(body)
+
+
+def decode_short_code(code):
+    """id рецепта или None, если код не сгенерирован encode_recipe_id."""
+    if len(code) != CODE_LENGTH or any(char not in _INDEX for char in code):
+        return None
+    body, check = code[:BODY_LENGTH], code[BODY_LENGTH:]
+    if _checksum(body) != check:
+        return None
+    value = 0
+    for char in body:
+        value = value * BASE + _INDEX[char]
+    recipe_id = (value - OFFSET) * INVERSE % MODULUS
+    return recipe_id or None
+
+
+def is_legacy_code(code):
+    return len(code) != CODE_LENGTH
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Массовая запись в обход сигналов моделей (bulk_create, bulk_update).
+# sender — изменённая модель; сбрасывают свои кэши получатели в api.signals.
+bulk_changed = Signal()